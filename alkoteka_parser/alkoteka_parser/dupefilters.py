@@ -0,0 +1,60 @@
+from typing import Iterable, Iterator, Optional
+
+from scrapy.dupefilters import RFPDupeFilter
+from scrapy.utils.job import job_dir
+
+
+class BloomFilter:
+    """Bloom-фильтр для отпечатков запросов на битовом массиве фиксированного размера"""
+
+    def __init__(self, bit: int = 25, hash_number: int = 6):
+        self.mask = (1 << bit) - 1
+        self.hash_number = hash_number
+        self.bits = bytearray(1 << max(bit - 3, 0))
+
+    def _offsets(self, fingerprint: str) -> Iterator[int]:
+        """Вычисляет позиции битов двойным хешированием hex-отпечатка."""
+        h1 = int(fingerprint[:16], 16)
+        h2 = int(fingerprint[16:32], 16) | 1
+        return ((h1 + i * h2) & self.mask for i in range(self.hash_number))
+
+    def __contains__(self, fingerprint: str) -> bool:
+        bits = self.bits
+        return all(bits[offset >> 3] & (1 << (offset & 7)) for offset in self._offsets(fingerprint))
+
+    def add(self, fingerprint: str) -> None:
+        bits = self.bits
+        for offset in self._offsets(fingerprint):
+            bits[offset >> 3] |= 1 << (offset & 7)
+
+    def update(self, fingerprints: Iterable[str]) -> None:
+        for fingerprint in fingerprints:
+            self.add(fingerprint)
+
+
+class BloomRFPDupeFilter(RFPDupeFilter):
+    """Фильтр дубликатов запросов с памятью, не растущей с числом URL"""
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        debug: bool = False,
+        bit: int = 25,
+        hash_number: int = 6,
+        **kwargs,
+    ):
+        super().__init__(path, debug, **kwargs)
+        seen = self.fingerprints
+        self.fingerprints = BloomFilter(bit, hash_number)
+        self.fingerprints.update(seen)
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        return cls(
+            job_dir(settings),
+            settings.getbool("DUPEFILTER_DEBUG"),
+            settings.getint("BLOOMFILTER_BIT", 25),
+            settings.getint("BLOOMFILTER_HASH_NUMBER", 6),
+            fingerprinter=crawler.request_fingerprinter,
+        )
@@ -0,0 +1,12 @@
+from typing import Any
+
+import orjson
+from scrapy.exporters import JsonLinesItemExporter
+
+
+class OrjsonLinesItemExporter(JsonLinesItemExporter):
+    """Экспортер JSON Lines, сериализующий элементы через orjson"""
+
+    def export_item(self, item: Any) -> None:
+        itemdict = dict(self._get_serialized_fields(item))
+        self.file.write(orjson.dumps(itemdict, option=orjson.OPT_NON_STR_KEYS) + b"\n")
@@ -1,30 +1,13 @@
-import json
 import time
-from typing import Iterable, Dict, Any, List, Optional
-from urllib.parse import urlencode
+from typing import Iterable, Dict, Any, Optional, Union
+from urllib.parse import quote_plus
 from abc import ABC, abstractmethod
-from dataclasses import dataclass
 
+import orjson
 import scrapy
 from scrapy import Request
 from scrapy.http import Response
 
-@dataclass
-class ProductData:
-    """Data class для хранения информации о продукте"""
-    timestamp: int
-    RPC: str
-    url: str
-    title: str
-    marketing_tags: List[str]
-    brand: str
-    section: List[str]
-    price_data: Dict[str, Any]
-    stock: Dict[str, Any]
-    assets: Dict[str, Any]
-    metadata: Dict[str, Any]
-    variants: int
-
 
 class BaseAPIBuilder(ABC):
     """Абстрактный базовый класс для построителей API URL"""
@@ -40,148 +23,161 @@ class BaseAPIBuilder(ABC):
 class ProductListAPIBuilder(BaseAPIBuilder):
     """Класс для построения URL списка товаров"""
 
-    def build_url(self, category_slug: str, page: int = 1, per_page: int = 20) -> str:
+    URL_TEMPLATE = (
+        BaseAPIBuilder.BASE_API_URL
+        + "/product?city_uuid=" + BaseAPIBuilder.CITY_UUID
+        + "&page={page}&per_page={per_page}&root_category_slug={slug}"
+    )
+
+    def build_url(self, category_slug: str, page: int = 1, per_page: int = 100) -> str:
         """Генерирует URL API списка товаров."""
-        params = {
-            "city_uuid": self.CITY_UUID,
-            "page": page,
-            "per_page": per_page,
-            "root_category_slug": category_slug,
-        }
-        return f"{self.BASE_API_URL}/product?{urlencode(params)}"
+        return self.URL_TEMPLATE.format(page=page, per_page=per_page, slug=quote_plus(category_slug))
 
 
 class ProductDetailAPIBuilder(BaseAPIBuilder):
     """Класс для построения URL детальной информации о товаре"""
 
+    URL_TEMPLATE = (
+        BaseAPIBuilder.BASE_API_URL
+        + "/product/{slug}?city_uuid=" + BaseAPIBuilder.CITY_UUID
+    )
+
     def build_url(self, slug: str) -> str:
         """Генерирует URL API карточки товара."""
-        return f"{self.BASE_API_URL}/product/{slug}?city_uuid={self.CITY_UUID}"
+        return self.URL_TEMPLATE.format(slug=slug)
 
 
 class ProductParser:
     """Класс для парсинга данных продукта"""
 
+    DETAIL_FIELDS = frozenset((
+        "uuid",
+        "name",
+        "filter_labels",
+        "new",
+        "gift_package",
+        "description_blocks",
+        "category",
+        "price",
+        "prev_price",
+        "text_blocks",
+        "vendor_code",
+        "quantity_total",
+        "image_url",
+    ))
+
+    @staticmethod
+    def needs_detail(product: Dict[str, Any]) -> bool:
+        """Проверяет, нужна ли карточка товара для полного парсинга"""
+        return not product.keys() >= ProductParser.DETAIL_FIELDS
+
     @staticmethod
-    def build_title(product: Dict[str, Any]) -> str:
-        """Собирает полное название товара"""
+    def parse_product(
+        product_data: Dict[str, Any],
+        product_url: str,
+        ts: Optional[int] = None,
+    ) -> Dict[str, Any]:
+        """Парсит полные данные продукта за один проход, `ts` позволяет переиспользовать время ответа"""
+        product = product_data.get("results", {})
+
         name = product.get("name", "")
         filter_labels = product.get("filter_labels", [])
+        description_blocks = product.get("description_blocks", [])
+        category = product.get("category", {})
+        current_price = product.get("price")
+        original_price = product.get("prev_price")
+        text_blocks = product.get("text_blocks", [])
+        article = product.get("vendor_code")
+        quantity_total = product.get("quantity_total", 0)
 
-        for filter_label in filter_labels:
-            if filter_label.get("title"):
-                name += f", {filter_label['title']}"
-        return name
-
-    @staticmethod
-    def get_marketing_tags(product: Dict[str, Any]) -> List[str]:
-        """Извлекает маркетинговые теги"""
         marketing_tags = []
         if product.get("new"):
             marketing_tags.append("Новинка")
         if product.get("gift_package"):
             marketing_tags.append("Подарочная упаковка")
-        return marketing_tags
-
-    @staticmethod
-    def get_brand(product: Dict[str, Any]) -> str:
-        """Извлекает бренд товара"""
-        brand_name = ""
-        description_blocks = product.get("description_blocks", [])
-
-        for block in description_blocks:
-            if block.get("code") == "brend" and block.get("values"):
-                brand_name = block["values"][0].get("name", "")
-                break
-        return brand_name
 
-    @staticmethod
-    def get_section(product: Dict[str, Any]) -> List[str]:
-        """Извлекает разделы категорий"""
-        category = product.get("category", {})
-        parent_name = category.get("parent", {}).get("name", "") if category.get("parent") else ""
-        category_name = category.get("name", "")
-        return [parent_name, category_name]
+        brand_values = next(
+            (
+                block["values"]
+                for block in description_blocks
+                if block.get("code") == "brend" and block.get("values")
+            ),
+            [{}],
+        )
 
-    @staticmethod
-    def get_price_data(product: Dict[str, Any]) -> Dict[str, Any]:
-        """Извлекает данные о ценах"""
-        original_price = product.get("prev_price")
-        current_price = product.get("price", 0)
+        parent = category.get("parent")
 
         try:
-            current_price_float = float(current_price) if current_price is not None else 0.0
-            original_price_float = float(original_price) if original_price is not None else current_price_float
+            current = float(current_price) if current_price is not None else 0.0
+            original = float(original_price) if original_price is not None else current
         except (ValueError, TypeError):
-            current_price_float = 0.0
-            original_price_float = 0.0
-
-        has_discount = original_price_float > current_price_float > 0
-
-        sale_tag = ""
-        if has_discount:
-            discount = int((1 - current_price_float / original_price_float) * 100)
-            sale_tag = f"Скидка {discount}%"
-
-        return {
-            "current": current_price_float,
-            "original": original_price_float if has_discount else current_price_float,
-            "sale_tag": sale_tag
-        }
-    @staticmethod
-    def get_metadata(product: Dict[str, Any]) -> Dict[str, Any]:
-        """Извлекает метаданные товара"""
-        meta_dict = {}
-
-        text_blocks = product.get("text_blocks", [])
-        meta_dict["__description"] = text_blocks[0].get("content", "") if text_blocks else ""
-
-        article = product.get("vendor_code")
+            current = original = 0.0
+
+        if original > current > 0:
+            price_data = {
+                "current": current,
+                "original": original,
+                "sale_tag": f"Скидка {int((1 - current / original) * 100)}%",
+            }
+        else:
+            price_data = {"current": current, "original": current, "sale_tag": ""}
+
+        metadata = {"__description": text_blocks[0].get("content", "") if text_blocks else ""}
         if article:
-            meta_dict["article"] = article
-
-        filter_labels = product.get("filter_labels", [])
-        for fl in filter_labels:
-            meta_dict[fl.get("filter", "")] = fl.get("title", "")
-
-        return meta_dict
-
-    @staticmethod
-    def parse_product(product_data: Dict[str, Any], product_url: str) -> ProductData:
-        """Парсит полные данные продукта"""
-        product = product_data.get("results", {})
+            metadata["article"] = article
+        metadata.update({fl["filter"]: fl.get("title", "") for fl in filter_labels if "filter" in fl})
 
-        return ProductData(
-            timestamp=int(time.time()),
-            RPC=product.get("uuid", ""),
-            url=product_url,
-            title=ProductParser.build_title(product),
-            marketing_tags=ProductParser.get_marketing_tags(product),
-            brand=ProductParser.get_brand(product),
-            section=ProductParser.get_section(product),
-            price_data=ProductParser.get_price_data(product),
-            stock={
-                "in_stock": int(product.get("quantity_total", 0)) > 0,
-                "count": product.get("quantity_total", 0),
+        return {
+            "timestamp": int(time.time()) if ts is None else ts,
+            "RPC": product.get("uuid", ""),
+            "url": product_url,
+            "title": name + "".join(
+                f", {filter_label['title']}"
+                for filter_label in filter_labels
+                if filter_label.get("title")
+            ),
+            "marketing_tags": marketing_tags,
+            "brand": brand_values[0].get("name", ""),
+            "section": (parent.get("name", "") if parent else "", category.get("name", "")),
+            "price_data": price_data,
+            "stock": {
+                "in_stock": int(quantity_total) > 0,
+                "count": quantity_total,
             },
-            assets={
+            "assets": {
                 "main_image": product.get("image_url", ""),
                 "set_images": [],
                 "view360": [],
                 "video": [],
             },
-            metadata=ProductParser.get_metadata(product),
-            variants=1,
-        )
+            "metadata": metadata,
+            "variants": 1,
+        }
 
 
 class AlkotekaDetailSpider(scrapy.Spider):
     name = "alkoteka_spider"
     custom_settings = {
         'USER_AGENT': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-        'FEED_FORMAT': 'json',
-        'FEED_URI': 'result.json',
-        'DOWNLOAD_DELAY': 0.5,
+        'FEED_EXPORTERS': {
+            'jsonl': 'alkoteka_parser.exporters.OrjsonLinesItemExporter',
+        },
+        'FEED_FORMAT': 'jsonl',
+        'FEED_URI': 'result.jsonl',
+        'DOWNLOAD_DELAY': 0,
+        'CONCURRENT_REQUESTS': 64,
+        'CONCURRENT_REQUESTS_PER_DOMAIN': 32,
+        'AUTOTHROTTLE_ENABLED': True,
+        'AUTOTHROTTLE_START_DELAY': 0.5,
+        'AUTOTHROTTLE_TARGET_CONCURRENCY': 16,
+        'COMPRESSION_ENABLED': True,
+        'DEFAULT_REQUEST_HEADERS': {
+            'Accept': 'application/json',
+            'Accept-Language': 'en',
+        },
+        'DUPEFILTER_CLASS': 'alkoteka_parser.dupefilters.BloomRFPDupeFilter',
+        'BLOOMFILTER_BIT': 25,
+        'BLOOMFILTER_HASH_NUMBER': 6,
         'ROBOTSTXT_OBEY': False,
     }
 
@@ -191,17 +187,24 @@ class AlkotekaDetailSpider(scrapy.Spider):
         # "https://alkoteka.com/catalog/bezalkogolnye-napitki-1"
     ]
 
+    PER_PAGE = 100
+
+    PARSE_ERRORS = (AttributeError, KeyError, TypeError, ValueError)
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.list_api_builder = ProductListAPIBuilder()
         self.detail_api_builder = ProductDetailAPIBuilder()
         self.product_parser = ProductParser()
+        self.seen_slugs = set()
 
     def start_requests(self) -> Iterable[Request]:
         """Загружает список товаров из каждой категории."""
         for category_url in self.START_URLS:
             category_slug = category_url.split("/")[-1]
-            api_url = self.list_api_builder.build_url(category_slug, page=1)
+            api_url = self.list_api_builder.build_url(
+                category_slug, page=1, per_page=self.PER_PAGE
+            )
 
             yield scrapy.Request(
                 url=api_url,
@@ -209,33 +212,51 @@ class AlkotekaDetailSpider(scrapy.Spider):
                 meta={"category_slug": category_slug, "page": 1},
             )
 
-    def parse_product_list(self, response: Response) -> Iterable[Request]:
-        """Извлекает `slug` товаров и парсит каждую карточку."""
+    def parse_product_list(
+        self, response: Response
+    ) -> Iterable[Union[Request, Dict[str, Any]]]:
+        """Парсит товары из списка, карточку запрашивает только при нехватке данных."""
         try:
-            data = json.loads(response.text)
-        except json.JSONDecodeError:
+            data = orjson.loads(response.body)
+        except orjson.JSONDecodeError:
             self.logger.error(f"Failed to parse JSON from {response.url}")
             return
 
         products = data.get("results", [])
+        ts = int(time.time())
+        needs_detail = self.product_parser.needs_detail
+        parse_product = self.product_parser.parse_product
+        build_detail_url = self.detail_api_builder.build_url
+        seen_slugs = self.seen_slugs
 
         for product in products:
             slug = product.get("slug")
             product_url = product.get("product_url")
 
-            if slug and product_url:
-                detail_url = self.detail_api_builder.build_url(slug)
+            if not (slug and product_url) or slug in seen_slugs:
+                continue
+            seen_slugs.add(slug)
+
+            if needs_detail(product):
                 yield scrapy.Request(
-                    url=detail_url,
+                    url=build_detail_url(slug),
                     callback=self.parse_product_detail,
                     meta={"product_url": product_url}
                 )
+            else:
+                try:
+                    item = parse_product({"results": product}, product_url, ts)
+                except self.PARSE_ERRORS as e:
+                    self.logger.error(f"Failed to parse product {slug} from {response.url}: {e}")
+                    continue
+                yield item
 
         if data.get("meta", {}).get("has_more_pages"):
             next_page = response.meta["page"] + 1
             next_api_url = self.list_api_builder.build_url(
                 category_slug=response.meta["category_slug"],
                 page=next_page,
+                per_page=self.PER_PAGE,
             )
 
             yield scrapy.Request(
@@ -250,12 +271,12 @@ class AlkotekaDetailSpider(scrapy.Spider):
     def parse_product_detail(self, response: Response) -> Iterable[Dict[str, Any]]:
         """Парсит полные данные из карточки товара."""
         try:
-            product_data = json.loads(response.text)
+            product_data = orjson.loads(response.body)
             product = self.product_parser.parse_product(
                 product_data,
                 response.meta["product_url"]
             )
-            yield product.__dict__
+            yield product
 
-        except (json.JSONDecodeError, KeyError) as e:
+        except self.PARSE_ERRORS as e:
             self.logger.error(f"Failed to parse product detail from {response.url}: {e}")